@@ -1,141 +1,971 @@
 import ast
-import astunparse
+import fnmatch
+import glob
+import hashlib
+import io
+import json
 import os
-from typing import Any, List, Dict, Tuple, Union
+import re
+import tokenize
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, List, Dict, Tuple, Union, Iterable, Iterator, Optional, Set, FrozenSet, NamedTuple
 
+# Bump whenever the inference rules change so cached "no change" results are invalidated.
+TOOL_VERSION = "4"
+DEFAULT_CACHE_PATH = ".add_typing_cache.json"
+SKIP_DIRS = {".git", ".hg", ".svn", ".tox", ".nox", ".venv", "venv", "__pycache__", "node_modules"}
 
-def infer_type(node: ast.AST) -> str:
+# Per-module index: {"calls": {callee: return type}, "names": {module-level name: type},
+# "imports": {local name: [module, imported attribute or None for a module]}}.
+# Names bound more than once with different types, or by loops, with blocks etc., are typed "Any".
+ModuleIndex = Dict[str, Dict[str, Any]]
+# Project-wide index: {dotted module name: ModuleIndex}.
+TypeIndex = Dict[str, ModuleIndex]
+BUILTIN_CALL_TYPES = {
+    "int": "int", "float": "float", "str": "str", "bool": "bool", "bytes": "bytes",
+    "list": "List[Any]", "dict": "Dict[Any, Any]", "set": "Set[Any]", "tuple": "Tuple[Any, ...]",
+}
+# Literals longer than this are inferred from an evenly spaced sample of their elements.
+MAX_SAMPLE = 32
+# Tuples up to this length get positional types; longer ones become Tuple[T, ...].
+MAX_TUPLE_ARITY = 8
+# Re-exports followed when resolving an imported name (from a import f, where a imports f from b, ...).
+MAX_IMPORT_HOPS = 4
+# Names an annotation may use without them being bound in the module it is written to.
+TYPING_NAMES = {"Any", "List", "Dict", "Set", "Tuple", "Union", "Optional", "None"} | set(BUILTIN_CALL_TYPES)
+
+
+class Scope(NamedTuple):
+    """Where an expression is evaluated: its module in the project index and the names bound locally."""
+    index: TypeIndex
+    module: str
+    local_names: FrozenSet[str] = frozenset()
+
+
+def merge_types(types: Iterable[str]) -> str:
+    """
+    Merge inferred types into a single type, using Union for several distinct ones.
+
+    Args:
+        types (Iterable[str]): Inferred types.
+
+    Returns:
+        str: The merged type; "Any" absorbs everything else.
+    """
+    unique = sorted(set(types))
+    if not unique or "Any" in unique:
+        return "Any"
+    if len(unique) == 1:
+        return unique[0]
+    return f"Union[{', '.join(unique)}]"
+
+
+def _sample(elements: List[Any]) -> List[Any]:
+    """Return at most MAX_SAMPLE evenly spaced elements, always including the first and last ones."""
+    if len(elements) <= MAX_SAMPLE:
+        return elements
+    step = (len(elements) - 1) / (MAX_SAMPLE - 1)
+    return [elements[round(i * step)] for i in range(MAX_SAMPLE)]
+
+
+def infer_type(node: ast.AST, scope: Optional[Scope] = None) -> str:
     """
     Infer the type of a given AST node with more specificity.
 
+    Container literals are inferred from a bounded sample of their elements, and the
+    result is memoized on the node, so huge constant tables cost O(MAX_SAMPLE).
+
     Args:
         node (ast.AST): The AST node.
+        scope (Optional[Scope]): Module and local names used to resolve names and calls.
 
     Returns:
         str: The inferred type as a string.
     """
+    memo = node.__dict__.setdefault("_inferred_types", {})
+    cached = memo.get(id(scope))
+    if cached is None or cached[0] is not scope:  # Keep the scope alive so its id is not reused
+        cached = memo[id(scope)] = (scope, _infer_type(node, scope))
+    return cached[1]
+
+
+def _infer_type(node: ast.AST, scope: Optional[Scope]) -> str:
     if isinstance(node, ast.Constant):
-        if isinstance(node.value, int):
+        if isinstance(node.value, bool):  # Checked before int, bool is a subclass of it
+            return "bool"
+        elif isinstance(node.value, int):
             return "int"
         elif isinstance(node.value, float):
             return "float"
         elif isinstance(node.value, str):
             return "str"
-        elif isinstance(node.value, bool):
-            return "bool"
         elif node.value is None:
             return "None"
     elif isinstance(node, ast.List):
         if node.elts:
-            element_type = infer_type(node.elts[0])
+            element_type = merge_types(infer_type(elt, scope) for elt in _sample(node.elts))
             return f"List[{element_type}]"
         return "List[Any]"
+    elif isinstance(node, ast.Set):
+        element_type = merge_types(infer_type(elt, scope) for elt in _sample(node.elts))
+        return f"Set[{element_type}]"
     elif isinstance(node, ast.Dict):
         if node.keys and node.values:
-            key_type = infer_type(node.keys[0])
-            value_type = infer_type(node.values[0])
+            pairs = _sample(list(zip(node.keys, node.values)))
+            if any(key is None for key, _ in pairs):  # {**other} unpacking
+                return "Dict[Any, Any]"
+            key_type = merge_types(infer_type(key, scope) for key, _ in pairs)
+            value_type = merge_types(infer_type(value, scope) for _, value in pairs)
             return f"Dict[{key_type}, {value_type}]"
         return "Dict[Any, Any]"
     elif isinstance(node, ast.Tuple):
+        if len(node.elts) > MAX_TUPLE_ARITY:
+            element_type = merge_types(infer_type(elt, scope) for elt in _sample(node.elts))
+            return f"Tuple[{element_type}, ...]"
         if node.elts:
-            element_types = ", ".join(infer_type(elt) for elt in node.elts)
+            element_types = ", ".join(infer_type(elt, scope) for elt in node.elts)
             return f"Tuple[{element_types}]"
         return "Tuple[Any, ...]"
     elif isinstance(node, ast.Name):
-        return node.id  # May be a variable name
+        if scope is None:
+            return node.id  # May be a variable name
+        if node.id in scope.local_names:
+            return "Any"  # Parameter or local variable: its type is not tracked
+        return _visible(lookup(scope.index, scope.module, node.id, "names"), scope)
     elif isinstance(node, ast.Call):
-        return "Any"  # Calls cannot be inferred without context
+        if scope is None:
+            return "Any"  # Calls cannot be inferred without context
+        func = node.func
+        if isinstance(func, ast.Name):
+            if func.id in scope.local_names:
+                return "Any"
+            if is_bound(scope.index, scope.module, func.id):
+                return _visible(lookup(scope.index, scope.module, func.id, "calls"), scope)
+            return BUILTIN_CALL_TYPES.get(func.id, "Any")
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and (
+                func.value.id not in scope.local_names):
+            # Only module.function(...) on an imported project module; methods of arbitrary objects stay Any
+            module = imported_module(scope.index, scope.module, func.value.id)
+            if module is not None:
+                return _visible(lookup(scope.index, module, func.attr, "calls"), scope)
+        return "Any"
     return "Any"
 
 
-def infer_function_return_type(func: ast.FunctionDef) -> str:
+def is_bound(index: TypeIndex, module: str, name: str) -> bool:
+    """Whether name is defined in or imported into the module at module level."""
+    entry = index.get(module)
+    return entry is not None and any(name in entry[kind] for kind in ("calls", "names", "imports"))
+
+
+def lookup(index: TypeIndex, module: str, name: str, kind: str, hops: int = 0) -> str:
+    """
+    Resolve a module-level name of a module, following explicit imports into other project modules.
+
+    Args:
+        index (TypeIndex): The project-wide index.
+        module (str): Dotted name of the module the name is looked up in.
+        name (str): The name.
+        kind (str): "calls" for the return type of calling it, "names" for its value type.
+        hops (int): Imports followed so far.
+
+    Returns:
+        str: The type, or "Any" when the name is unknown, ambiguous or not from a project module.
+    """
+    entry = index.get(module)
+    if entry is None or hops > MAX_IMPORT_HOPS:
+        return "Any"
+    if name in entry["calls"] or name in entry["names"]:
+        return entry[kind].get(name, "Any")
+    target = entry["imports"].get(name)
+    if target is None or target[1] is None:
+        return "Any"
+    return lookup(index, target[0], target[1], kind, hops + 1)
+
+
+def imported_module(index: TypeIndex, module: str, name: str) -> Optional[str]:
+    """Return the project module a name refers to (import a.b as name, from a import b), if any."""
+    entry = index.get(module)
+    target = entry["imports"].get(name) if entry is not None else None
+    if target is None:
+        return None
+    target_module = target[0] if target[1] is None else f"{target[0]}.{target[1]}"
+    return target_module if target_module in index else None
+
+
+def _type_names(type_name: str) -> Set[str]:
+    """Root names a type refers to besides the typing and builtin ones (e.g. {"Foo"} for List[Foo])."""
+    roots = {identifier.split(".")[0] for identifier in re.findall(r"[A-Za-z_][\w.]*", type_name)}
+    return roots - TYPING_NAMES
+
+
+def _visible(type_name: str, scope: Scope) -> str:
+    """Keep a resolved type only if every name it uses can be referenced from the scope's module."""
+    if all(is_bound(scope.index, scope.module, root) for root in _type_names(type_name)):
+        return type_name
+    return "Any"
+
+
+def annotation_text(type_name: str) -> str:
+    """
+    Write a resolved type as an annotation that cannot fail when the module is imported.
+
+    Project names may be bound after the function (a class defined further down) or only
+    for type checkers (if TYPE_CHECKING: imports), so types using them become string
+    literals, which are not evaluated at definition time.
+
+    Args:
+        type_name (str): The resolved type.
+
+    Returns:
+        str: The type, quoted if it refers to names other than typing and builtin ones.
+    """
+    if not _type_names(type_name):
+        return type_name
+    return f'"{type_name}"' if '"' not in type_name else repr(type_name)
+
+
+def _annotation_type(annotation: ast.expr) -> str:
+    """The type an existing annotation denotes, unwrapping string annotations ("Foo" -> Foo)."""
+    if isinstance(annotation, ast.Constant) and isinstance(annotation.value, str):
+        return annotation.value
+    return ast.unparse(annotation)
+
+
+def local_bindings(func: ast.FunctionDef) -> FrozenSet[str]:
+    """
+    Collect the names bound inside a function: parameters, assignment and loop targets, imports, etc.
+
+    Args:
+        func (ast.FunctionDef): The function definition.
+
+    Returns:
+        FrozenSet[str]: Names that must not be resolved against the module.
+    """
+    names = set()
+    for node in ast.walk(func):
+        if isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and node is not func:
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split(".")[0] for alias in node.names)
+        elif isinstance(node, (ast.ExceptHandler, ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            names.add(node.rest)
+    return frozenset(names)
+
+
+def infer_function_return_type(func: ast.FunctionDef, scope: Optional[Scope] = None) -> str:
     """
     Infer the return type of a function based on its return statements.
 
     Args:
         func (ast.FunctionDef): The function definition.
+        scope (Optional[Scope]): Scope of the module defining the function; its local names are added here.
 
     Returns:
         str: The inferred return type as a string.
     """
+    if scope is not None:
+        scope = scope._replace(local_names=scope.local_names | local_bindings(func))
     return_types = set()
     for node in ast.walk(func):
         if isinstance(node, ast.Return) and node.value:
-            return_types.add(infer_type(node.value))
+            return_types.add(infer_type(node.value, scope))
     if not return_types:
         return "None"
-    if len(return_types) == 1:
-        return return_types.pop()
-    return f"Union[{', '.join(return_types)}]"  # Handle multiple return types
+    return merge_types(return_types)  # Handle multiple return types
 
 
-def add_type_hints_to_function(func: ast.FunctionDef) -> ast.FunctionDef:
+def add_type_hints_to_function(func: ast.FunctionDef, scope: Optional[Scope] = None) -> bool:
     """
     Add type hints to a function based on its arguments and return type.
 
     Args:
-        func (ast.FunctionDef): The function definition.
+        func (ast.FunctionDef): The function definition, modified in place.
+        scope (Optional[Scope]): Scope of the module defining the function, used to resolve names and calls.
 
     Returns:
-        ast.FunctionDef: The modified function definition with added type hints.
+        bool: True if any annotation was added.
     """
     num_defaults = len(func.args.defaults)
     default_offset = len(func.args.args) - num_defaults
+    modified = False
 
     for i, arg in enumerate(func.args.args):
         if arg.annotation is None:  # Only add if not already annotated
             if i >= default_offset:  # Argument has a default value
                 default_value = func.args.defaults[i - default_offset]
-                arg.annotation = ast.Name(id=infer_type(default_value), ctx=ast.Load())
+                type_name = infer_type(default_value, scope)
+                arg.annotation = ast.Name(id=annotation_text(type_name) if scope is not None else type_name, ctx=ast.Load())
             else:
                 arg.annotation = ast.Name(id="Any", ctx=ast.Load())
+            modified = True
 
     if func.returns is None:
-        func.returns = ast.Name(id=infer_function_return_type(func), ctx=ast.Load())
+        type_name = infer_function_return_type(func, scope)
+        func.returns = ast.Name(id=annotation_text(type_name) if scope is not None else type_name, ctx=ast.Load())
+        modified = True
+
+    return modified
+
+
+def _char_col(line: str, byte_col: int) -> int:
+    """Convert an ast UTF-8 byte column into a character column of the line."""
+    return len(line.encode("utf-8")[:byte_col].decode("utf-8"))
 
-    return func
 
+def _params_end(lines: List[str], func: ast.FunctionDef) -> Tuple[int, int]:
+    """Find the (line index, column) just after the ')' closing a function's parameter list."""
+    start = func.lineno - 1
+    readline = iter(lines[start:] + [""]).__next__
+    depth = 0
+    for token in tokenize.generate_tokens(readline):
+        if token.type == tokenize.OP and token.string in "()":
+            depth += 1 if token.string == "(" else -1
+            if depth == 0:
+                return start + token.end[0] - 1, token.end[1]
+    raise ValueError(f"Cannot find the parameter list of '{func.name}'.")
 
-def process_file(file_path: str) -> None:
+
+def annotation_edits(func: ast.FunctionDef, lines: List[str]) -> List[Tuple[int, int, str]]:
+    """
+    Collect the source insertions for the annotations add_type_hints_to_function added.
+
+    Annotations added by this tool have no source position, which tells them apart
+    from the ones already written in the file.
+
+    Args:
+        func (ast.FunctionDef): A function processed by add_type_hints_to_function.
+        lines (List[str]): The original source lines.
+
+    Returns:
+        List[Tuple[int, int, str]]: (line index, column, text) insertions.
+    """
+    edits = []
+    for arg in func.args.args:
+        if not hasattr(arg.annotation, "lineno"):
+            line = arg.end_lineno - 1
+            edits.append((line, _char_col(lines[line], arg.end_col_offset), f": {arg.annotation.id}"))
+    if not hasattr(func.returns, "lineno"):
+        line, col = _params_end(lines, func)
+        edits.append((line, col, f" -> {func.returns.id}"))
+    return edits
+
+
+def apply_edits(lines: List[str], edits: List[Tuple[int, int, str]]) -> str:
+    """
+    Splice insertions into the source, leaving everything else byte-for-byte intact.
+
+    Args:
+        lines (List[str]): The original source lines; modified in place.
+        edits (List[Tuple[int, int, str]]): (line index, column, text) insertions.
+
+    Returns:
+        str: The new source code.
+    """
+    # Apply right to left so earlier offsets on the same line stay valid.
+    for line, col, text in sorted(edits, reverse=True):
+        lines[line] = lines[line][:col] + text + lines[line][col:]
+    return "".join(lines)
+
+
+def process_file(file_path: str, index: Optional[TypeIndex] = None) -> str:
     """
     Process a Python file and add type hints to its functions.
 
     Args:
         file_path (str): Path to the Python file.
+        index (Optional[TypeIndex]): Project-wide index built by build_type_index; names and calls
+            are resolved against the file's own module in it.
+
+    Returns:
+        str: "changed" if the file was rewritten, "skipped" if no hints were needed,
+            "failed" if the file does not exist.
     """
     if not os.path.isfile(file_path):
         print(f"Error: The file '{file_path}' does not exist.")
-        return
+        return "failed"
 
-    with open(file_path, "r") as file:
-        source_code = file.read()
+    # Bytes in, bytes out: the declared encoding (or BOM) and every line ending are kept as they are
+    with open(file_path, "rb") as file:
+        data = file.read()
+    encoding = tokenize.detect_encoding(io.BytesIO(data).readline)[0]
+    source_code = data.decode(encoding)
 
     tree = ast.parse(source_code)
-    modified = False
+    # newline="" splits on \n, \r\n and \r like the parser does, without translating them
+    lines = io.StringIO(source_code, newline="").readlines()
+    scope = Scope(index, module_name(file_path)[0]) if index is not None else None
+    edits = []
 
     for node in tree.body:
-        if isinstance(node, ast.FunctionDef):
-            original_node = ast.dump(node)
-            add_type_hints_to_function(node)
-            if original_node != ast.dump(node):
-                modified = True
-
-    if modified:
-        with open(file_path, "w") as file:
-            file.write(astunparse.unparse(tree))
+        if isinstance(node, ast.FunctionDef) and add_type_hints_to_function(node, scope):
+            edits.extend(annotation_edits(node, lines))
+
+    if edits:
+        with open(file_path, "wb") as file:
+            file.write(apply_edits(lines, edits).encode(encoding))
         print(f"Type hints added to '{file_path}'.")
+        return "changed"
     else:
         print(f"No changes made to '{file_path}'.")
+        return "skipped"
+
+
+def iter_python_files(path: str, pattern: str = "*.py") -> Iterator[str]:
+    """
+    Expand a file, directory or glob into the Python files it refers to.
+
+    Args:
+        path (str): A file path, a directory to walk recursively, or a glob such as "src/**/*.py".
+        pattern (str): Filename pattern used when walking a directory.
+
+    Yields:
+        str: Paths of the matching files.
+    """
+    if glob.has_magic(path):
+        for match in sorted(glob.glob(path, recursive=True)):
+            if os.path.isfile(match):
+                yield match
+    elif os.path.isdir(path):
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+            for filename in sorted(filenames):
+                if fnmatch.fnmatch(filename, pattern):
+                    yield os.path.join(dirpath, filename)
+    else:
+        yield path
+
+
+@lru_cache(maxsize=None)
+def _package_parts(directory: str) -> Tuple[str, ...]:
+    """Names of the packages enclosing a directory, outermost first (empty outside a package)."""
+    if not os.path.isfile(os.path.join(directory, "__init__.py")):
+        return ()
+    parent, package = os.path.split(directory)
+    return _package_parts(parent) + (package,)
+
+
+def module_name(file_path: str) -> Tuple[str, bool]:
+    """
+    Derive the dotted module name a file is imported as.
+
+    Args:
+        file_path (str): Path to a Python file.
+
+    Returns:
+        Tuple[str, bool]: The module name and whether the file is a package's __init__.py.
+    """
+    directory, filename = os.path.split(os.path.abspath(file_path))
+    stem = os.path.splitext(filename)[0]
+    is_package = stem == "__init__"
+    return ".".join(_package_parts(directory) + (() if is_package else (stem,))), is_package
+
+
+def _import_base(node: ast.ImportFrom, module: str, is_package: bool) -> Optional[str]:
+    """Absolute module name of a from-import, resolving relative imports; None if it leaves the project."""
+    if not node.level:
+        return node.module
+    parts = module.split(".") if is_package else module.split(".")[:-1]
+    if node.level - 1 > len(parts):
+        return None
+    parts = parts[:len(parts) - (node.level - 1)]
+    return ".".join(parts + ([node.module] if node.module else []))
+
+
+def _module_statements(body: List[ast.stmt]) -> Iterator[ast.AST]:
+    """Yield the statements executed at module level, descending into if/try/with/for/match blocks."""
+    for node in body:
+        yield node
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            for field in ("body", "orelse", "finalbody", "handlers"):
+                yield from _module_statements(getattr(node, field, []))
+            for case in getattr(node, "cases", []):
+                yield from _module_statements(case.body)
+
+
+def _stored_names(node: ast.AST) -> Iterator[str]:
+    """Names a statement binds outside its nested blocks (for targets, with ... as, +=, :=, del)."""
+    for field, value in ast.iter_fields(node):
+        if field in ("body", "orelse", "finalbody", "handlers", "cases"):
+            continue
+        for child in value if isinstance(value, list) else [value]:
+            if isinstance(child, ast.AST):
+                for sub in ast.walk(child):
+                    if isinstance(sub, ast.Name) and not isinstance(sub.ctx, ast.Load):
+                        yield sub.id
+
+
+def index_module(source_code: str, module: str = "", is_package: bool = False) -> ModuleIndex:
+    """
+    Collect the top-level function signatures, classes, assignments and imports of one module.
+
+    Args:
+        source_code (str): The module source.
+        module (str): Dotted name of the module, used to resolve relative imports.
+        is_package (bool): Whether the module is a package's __init__.py.
+
+    Returns:
+        ModuleIndex: The module's callables, module-level names and imports with their types.
+    """
+    tree = ast.parse(source_code)
+    # name -> list of (kind, value); value is a type, an AST node still to be typed, or an import target
+    bindings: Dict[str, List[Tuple[str, Any]]] = {}
+
+    def bind(name: str, kind: str, value: Any = None) -> None:
+        bindings.setdefault(name, []).append((kind, value))
+
+    for node in _module_statements(tree.body):
+        if isinstance(node, ast.FunctionDef):
+            bind(node.name, "calls", node)
+        elif isinstance(node, ast.ClassDef):
+            bind(node.name, "calls", node.name)  # Calling a class constructs an instance
+        elif isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+            bind(node.target.id, "names", _annotation_type(node.annotation))
+        elif isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    bind(target.id, "names", node.value)
+                else:
+                    for name in _stored_names(target):
+                        bind(name, "other")
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    bind(alias.asname, "imports", (alias.name, None))
+                else:  # import a.b binds a
+                    root = alias.name.split(".")[0]
+                    bind(root, "imports", (root, None))
+        elif isinstance(node, ast.ImportFrom):
+            base = _import_base(node, module, is_package)
+            for alias in node.names:
+                if alias.name != "*":
+                    bind(alias.asname or alias.name, "imports" if base else "other", (base, alias.name))
+        elif isinstance(node, ast.ExceptHandler):
+            if node.name:
+                bind(node.name, "other")
+        else:
+            for name in _stored_names(node):
+                bind(name, "other")
+
+    # Resolve values against the module's own bindings, so builtins shadowed by the module are not used
+    own: ModuleIndex = {"calls": {}, "names": {}, "imports": {}}
+    for name, values in bindings.items():
+        kind, value = values[0]
+        if len(values) == 1 and kind == "imports":
+            own["imports"][name] = list(value)
+        elif len(values) == 1 and kind == "calls" and isinstance(value, str):
+            own["calls"][name] = value
+        else:
+            own["names"][name] = "Any"
+    scope = Scope({module: own}, module)
+
+    index: ModuleIndex = {"calls": {}, "names": {}, "imports": {}}
+    for name, values in bindings.items():
+        typed = set()
+        for kind, value in values:
+            if kind == "calls" and isinstance(value, ast.FunctionDef):
+                value = _annotation_type(value.returns) if value.returns else infer_function_return_type(value, scope)
+            elif kind == "names" and isinstance(value, ast.AST):
+                value = infer_type(value, scope)
+            typed.add((kind, value if kind != "imports" else tuple(value)))
+        if len(typed) == 1 and next(iter(typed))[0] != "other":
+            kind, value = typed.pop()
+            index[kind][name] = list(value) if kind == "imports" else value
+        else:
+            index["names"][name] = "Any"  # Bound, but not to a single known type
+    return index
+
+
+def _index_file_safely(task: Tuple[str, str, bool, Optional[str]]) -> Tuple[str, str, Optional[ModuleIndex]]:
+    """Index one file; returns (path, digest, index), with index None when the digest matched the cached one."""
+    file_path, module, is_package, cached_digest = task
+    try:
+        with open(file_path, "rb") as file:
+            data = file.read()
+    except OSError:
+        return file_path, "", {"calls": {}, "names": {}, "imports": {}}
+    digest = content_digest(data)
+    if digest == cached_digest:
+        return file_path, digest, None
+    try:
+        return file_path, digest, index_module(data.decode("utf-8"), module, is_package)
+    except (SyntaxError, ValueError, UnicodeDecodeError):
+        return file_path, digest, {"calls": {}, "names": {}, "imports": {}}
+
+
+def build_type_index(files: List[str], workers: Optional[int] = None,
+                     cache: Optional["FileCache"] = None) -> TypeIndex:
+    """
+    Build the project-wide type index in a single pass over all files.
+
+    Modules whose entry in the cache is still fresh are not read again; the others are
+    re-indexed (only parsed if their digest changed) and recorded in the cache.
+
+    Args:
+        files (List[str]): Python files of the project.
+        workers (Optional[int]): Number of worker processes; defaults to os.cpu_count().
+        cache (Optional[FileCache]): Cache of per-module index entries; updated in place.
+
+    Returns:
+        TypeIndex: The index of every module, to be shared by every file being annotated.
+    """
+    index: TypeIndex = {}
+    modules: Dict[str, List[str]] = {}
+    tasks = []
+    for file_path in files:
+        module, is_package = module_name(file_path)
+        modules.setdefault(module, []).append(file_path)
+        cached = cache.module_entry(file_path, module) if cache is not None else None
+        if cached is not None and cached[0] is not None:
+            index[module] = cached[0]
+        else:
+            tasks.append((file_path, module, is_package, cached[1] if cached is not None else None))
+
+    if tasks:
+        workers = min(workers or os.cpu_count() or 1, len(tasks))
+        if workers == 1:
+            results = map(_index_file_safely, tasks)
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(_index_file_safely, tasks, chunksize=max(1, len(tasks) // (workers * 4)))
+        try:
+            for (file_path, module, _, _), (_, digest, module_index) in zip(tasks, results):
+                if module_index is None:  # Touched but unchanged
+                    module_index = cache.modules[os.path.abspath(file_path)][4]
+                index[module] = module_index
+                if cache is not None and digest:
+                    cache.record_module(file_path, module, digest, module_index)
+        finally:
+            if workers > 1:
+                executor.shutdown()
+
+    for module, paths in modules.items():
+        if len(paths) > 1:  # Several top-level scripts with the same name: imports of it are ambiguous
+            index[module] = {"calls": {}, "names": {}, "imports": {}}
+    return index
+
+
+def index_fingerprint(index: TypeIndex) -> str:
+    """Short hash of an index, used to invalidate cached results when the index changes."""
+    return hashlib.sha256(json.dumps(index, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def module_fingerprint(index: TypeIndex, module: str) -> str:
+    """
+    Hash the index entries a module's names and calls can resolve against.
+
+    That is the module itself plus the modules it imports, followed as far as lookup
+    follows re-exports. Modules that are imported but not in the index are included as
+    missing, so adding them later also changes the fingerprint. Edits elsewhere in the
+    project leave it unchanged.
+
+    Args:
+        index (TypeIndex): The project-wide index.
+        module (str): Dotted name of the module.
+
+    Returns:
+        str: Short hex digest.
+    """
+    seen = {module}
+    frontier = [module]
+    for _ in range(MAX_IMPORT_HOPS + 1):
+        next_frontier = []
+        for name in frontier:
+            for target_module, attribute in index.get(name, {}).get("imports", {}).values():
+                # from a import b may import the submodule a.b
+                for candidate in (target_module, f"{target_module}.{attribute}" if attribute else None):
+                    if candidate and candidate not in seen:
+                        seen.add(candidate)
+                        next_frontier.append(candidate)
+        frontier = next_frontier
+    return index_fingerprint({name: index.get(name) for name in seen})
+
+
+def content_digest(data: bytes) -> str:
+    """Hash file content together with TOOL_VERSION."""
+    digest = hashlib.sha256(TOOL_VERSION.encode())
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def file_digest(file_path: str) -> str:
+    """
+    Hash a file's content together with TOOL_VERSION.
+
+    Args:
+        file_path (str): Path to the file.
+
+    Returns:
+        str: Hex digest identifying this content for this version of the tool.
+    """
+    with open(file_path, "rb") as file:
+        return content_digest(file.read())
+
+
+class FileCache:
+    """
+    Persistent record of files that are already annotated or need no change.
+
+    Entries map a path to its (size, mtime_ns, digest, fingerprint), where fingerprint
+    identifies the index entries the file was annotated against (module_fingerprint, or ""
+    without --infer-project). A matching stat result and fingerprint are trusted without
+    reading the file, so a warm run costs about one stat per file; when the stat differs
+    (e.g. a fresh checkout) the content digest is compared instead. Per-module type index
+    entries are kept the same way, as (size, mtime_ns, digest, module name, module index).
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        try:
+            with open(self.path, "r") as file:
+                self._data = json.load(file)
+        except (OSError, ValueError):
+            self._data = {}
+        same_tool = self._data.get("version") == TOOL_VERSION
+        self.entries: Dict[str, List[Any]] = self._data.get("files", {}) if same_tool else {}
+        self.modules: Dict[str, List[Any]] = self._data.get("modules", {}) if same_tool else {}
+
+    def known(self) -> Set[Tuple[str, str]]:
+        """(digest, fingerprint) pairs of content known to need no change."""
+        return {(entry[2], entry[3]) for entry in self.entries.values()}
+
+    def is_fresh(self, file_path: str, fingerprint: str = "") -> bool:
+        entry = self.entries.get(os.path.abspath(file_path))
+        if entry is None or entry[3] != fingerprint:
+            return False
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return False
+        return entry[0] == st.st_size and entry[1] == st.st_mtime_ns
+
+    def record(self, file_path: str, digest: str, fingerprint: str = "") -> None:
+        st = os.stat(file_path)
+        self.entries[os.path.abspath(file_path)] = [st.st_size, st.st_mtime_ns, digest, fingerprint]
+
+    def module_entry(self, file_path: str, module: str) -> Optional[Tuple[Optional[ModuleIndex], str]]:
+        """
+        Look up the cached index entries of a module.
+
+        Args:
+            file_path (str): Path to the module's file.
+            module (str): Its current dotted module name.
+
+        Returns:
+            Optional[Tuple[Optional[ModuleIndex], str]]: None if nothing usable is cached; otherwise
+                (index, digest), where index is None when the stat changed and the digest must be compared.
+        """
+        entry = self.modules.get(os.path.abspath(file_path))
+        if entry is None or entry[3] != module:
+            return None
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        fresh = entry[0] == st.st_size and entry[1] == st.st_mtime_ns
+        return (entry[4] if fresh else None), entry[2]
+
+    def record_module(self, file_path: str, module: str, digest: str, module_index: ModuleIndex) -> None:
+        st = os.stat(file_path)
+        self.modules[os.path.abspath(file_path)] = [st.st_size, st.st_mtime_ns, digest, module, module_index]
+
+    def save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"version": TOOL_VERSION, "files": self.entries, "modules": self.modules}, file)
+        os.replace(tmp_path, self.path)
+
+
+# (digest, fingerprint) pairs known to need no change and the shared type index;
+# set per worker process by _init_worker.
+_known_digests: Set[Tuple[str, str]] = set()
+_type_index: Optional[TypeIndex] = None
+
+
+def _init_worker(known_digests: Set[Tuple[str, str]], type_index: Optional[TypeIndex] = None) -> None:
+    global _known_digests, _type_index
+    _known_digests = known_digests
+    _type_index = type_index
+
+
+def _process_file_safely(task: Tuple[str, str]) -> Tuple[str, str, Optional[str], Optional[str], str]:
+    """Worker entry point: never raises, so one bad file does not abort the pool."""
+    file_path, fingerprint = task
+    try:
+        if _known_digests and os.path.isfile(file_path):
+            digest = file_digest(file_path)
+            if (digest, fingerprint) in _known_digests:
+                return file_path, "cached", None, digest, fingerprint
+        status = process_file(file_path, _type_index)
+        digest = file_digest(file_path) if status != "failed" else None
+        return file_path, status, None, digest, fingerprint
+    except Exception as e:
+        return file_path, "failed", f"{type(e).__name__}: {e}", None, fingerprint
+
+
+def process_tree(paths: List[str], workers: Optional[int] = None,
+                 cache: Optional[FileCache] = None, infer_project: bool = False) -> Dict[str, List[str]]:
+    """
+    Add type hints to every Python file under the given paths using a process pool.
+
+    Parsing and unparsing are CPU-bound and independent per file, so files are fanned
+    out across worker processes (one per core by default). With a cache, files whose
+    content was already handled by this version of the tool are not parsed again.
+    With infer_project, an index of each module's signatures, classes, module-level
+    assignments and imports is built once up front (reusing cached entries of unchanged
+    modules) and shipped to each worker to resolve calls and names.
+
+    Args:
+        paths (List[str]): Files, directories or glob patterns to process.
+        workers (Optional[int]): Number of worker processes; defaults to os.cpu_count().
+        cache (Optional[FileCache]): Cache of unchanged files; updated and saved in place.
+        infer_project (bool): Build a project-wide type index before annotating.
+
+    Returns:
+        Dict[str, List[str]]: File paths grouped under "changed", "skipped", "cached" and "failed".
+    """
+    files = list(dict.fromkeys(f for path in paths for f in iter_python_files(path)))
+    summary: Dict[str, List[str]] = {"changed": [], "skipped": [], "cached": [], "failed": []}
+
+    type_index = build_type_index(files, workers, cache) if infer_project else None
+    # A file's result only depends on the index entries it can resolve against, so an edit
+    # elsewhere in the project does not invalidate it.
+    fingerprints: Dict[str, str] = {}
+    if type_index is not None:
+        by_module: Dict[str, str] = {}
+        for file_path in files:
+            module = module_name(file_path)[0]
+            if module not in by_module:
+                by_module[module] = module_fingerprint(type_index, module)
+            fingerprints[file_path] = by_module[module]
+
+    known_digests: Set[Tuple[str, str]] = set()
+    if cache is not None:
+        summary["cached"] = [f for f in files if cache.is_fresh(f, fingerprints.get(f, ""))]
+        fresh = set(summary["cached"])
+        files = [f for f in files if f not in fresh]
+        known_digests = cache.known()
+
+    if files:
+        tasks = [(f, fingerprints.get(f, "")) for f in files]
+        workers = min(workers or os.cpu_count() or 1, len(tasks))
+        # Large chunks amortise the IPC cost when there are many small files.
+        chunksize = max(1, len(tasks) // (workers * 4))
+
+        if workers == 1:
+            _init_worker(known_digests, type_index)
+            _collect(summary, map(_process_file_safely, tasks), cache)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(known_digests, type_index)) as executor:
+                _collect(summary, executor.map(_process_file_safely, tasks, chunksize=chunksize), cache)
+
+    if cache is not None:
+        cache.save()
+    return summary
+
+
+def _collect(summary: Dict[str, List[str]],
+             results: Iterator[Tuple[str, str, Optional[str], Optional[str], str]],
+             cache: Optional[FileCache]) -> None:
+    for file_path, status, error, digest, fingerprint in results:
+        summary[status].append(file_path)
+        if error:
+            print(f"An error occurred in '{file_path}': {error}")
+        elif cache is not None and digest is not None:
+            cache.record(file_path, digest, fingerprint)
+
+
+def print_summary(summary: Dict[str, List[str]]) -> None:
+    """
+    Print the number of changed, skipped and failed files.
+
+    Args:
+        summary (Dict[str, List[str]]): The result of process_tree.
+    """
+    print(
+        f"\n--- Summary ---\n"
+        f"Changed: {len(summary['changed'])}\n"
+        f"Skipped: {len(summary['skipped'])}\n"
+        f"Cached:  {len(summary['cached'])}\n"
+        f"Failed:  {len(summary['failed'])}"
+    )
+    for file_path in summary["failed"]:
+        print(f"  failed: {file_path}")
+
+
+def benchmark_change_detection(num_functions: int = 20000, repeat: int = 3) -> None:
+    """
+    Compare ast.dump-based change detection with the dirty flag on a synthetic module.
+
+    Args:
+        num_functions (int): Number of top-level functions in the generated module.
+        repeat (int): Number of timed runs; the best one is reported.
+    """
+    import timeit
+
+    source = "\n".join(
+        f"def func_{i}(a, b=1, c='x', d=[1, 2], e=None):\n"
+        f"    if a:\n        return {{'k': [a, b]}}\n    return (c, d, e)\n"
+        for i in range(num_functions)
+    )
+
+    def with_dump() -> None:
+        for node in ast.parse(source).body:
+            if isinstance(node, ast.FunctionDef):
+                original_node = ast.dump(node)
+                add_type_hints_to_function(node)
+                original_node != ast.dump(node)
+
+    def with_flag() -> None:
+        for node in ast.parse(source).body:
+            if isinstance(node, ast.FunctionDef):
+                add_type_hints_to_function(node)
+
+    parse_only = min(timeit.repeat(lambda: ast.parse(source), number=1, repeat=repeat))
+    dump_time = min(timeit.repeat(with_dump, number=1, repeat=repeat)) - parse_only
+    flag_time = min(timeit.repeat(with_flag, number=1, repeat=repeat)) - parse_only
+    print(f"{num_functions} functions (parse time of {parse_only:.3f}s excluded):")
+    print(f"  ast.dump comparison: {dump_time:.3f}s")
+    print(f"  dirty flag:          {flag_time:.3f}s ({dump_time / flag_time:.1f}x faster)")
 
 
 if __name__ == "__main__":
     import argparse
 
-    parser = argparse.ArgumentParser(description="Add type hints to a Python file.")
-    parser.add_argument("file", help="Path to the Python file to process.")
+    parser = argparse.ArgumentParser(description="Add type hints to Python files.")
+    parser.add_argument("paths", nargs="*", help="Python files, directories or glob patterns to process.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes for directory/glob mode (default: number of cores).")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH,
+                        help=f"Cache file of already processed files (default: {DEFAULT_CACHE_PATH}).")
+    parser.add_argument("--no-cache", action="store_true", help="Process every file, ignoring the cache.")
+    parser.add_argument("--infer-project", action="store_true",
+                        help="Index signatures, classes and module-level assignments across all given paths "
+                             "to resolve calls and names.")
+    parser.add_argument("--benchmark", type=int, metavar="N",
+                        help="Benchmark change detection on a synthetic module with N functions and exit.")
     args = parser.parse_args()
 
-    try:
-        process_file(args.file)
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    if args.benchmark:
+        benchmark_change_detection(args.benchmark)
+        raise SystemExit(0)
+    if not args.paths:
+        parser.error("at least one path is required")
+
+    cache = None if args.no_cache else FileCache(args.cache)
+    if len(args.paths) == 1 and os.path.isfile(args.paths[0]) and cache is None and not args.infer_project:
+        try:
+            process_file(args.paths[0])
+        except Exception as e:
+            print(f"An error occurred: {e}")
+    else:
+        print_summary(process_tree(args.paths, workers=args.workers, cache=cache,
+                                   infer_project=args.infer_project))
@@ -1,94 +1,515 @@
-from functools import wraps
-from inspect import signature
-from typing import get_type_hints, Any, List, Dict, Tuple, Union, Type, Callable
+from collections import Counter
+from functools import lru_cache, wraps
+from inspect import Parameter, signature
+from itertools import islice
+from typing import (
+    get_type_hints, Any, List, Dict, Tuple, Union, Type, Callable, Iterable, Iterator, Generator, NamedTuple, Optional,
+)
 import collections.abc
+import os
+import random
+import threading
 
-def is_instance_of(value: Any, expected_type: Type) -> bool:
+Checker = Callable[[Any], bool]
+
+STRATEGIES = ("full", "first_k", "random_k", "top_level")
+# Annotations whose iterator values are validated item by item as they are consumed.
+LAZY_ORIGINS = {collections.abc.Iterable, collections.abc.Iterator, collections.abc.Generator}
+
+
+class Validation(NamedTuple):
     """
-    Check if the value matches the expected type, including parameterized generics.
+    How much of a container value is checked.
 
-    Args:
-        value (Any): The value to check.
-        expected_type (Type): The expected type (possibly parameterized).
+    strategy: "full" checks every element, "first_k" the first sample_size elements,
+        "random_k" sample_size random elements of lists and tuples (other containers
+        fall back to the first ones), "top_level" only the container type itself.
+    sample_size: Number of elements checked by the sampling strategies.
+    max_depth: Nesting depth below which elements are no longer checked (None for unlimited).
+    """
+    strategy: str = "full"
+    sample_size: int = 10
+    max_depth: Optional[int] = None
 
-    Returns:
-        bool: True if value matches the type; False otherwise.
+
+FULL = Validation()
+
+
+def default_validation() -> Validation:
+    """
+    Read the default validation from the environment.
+
+    ENFORCE_TYPES_STRATEGY, ENFORCE_TYPES_SAMPLE_SIZE and ENFORCE_TYPES_MAX_DEPTH let
+    each deployment bound the cost of a check without touching the code.
+    """
+    max_depth = os.environ.get("ENFORCE_TYPES_MAX_DEPTH")
+    return Validation(
+        strategy=os.environ.get("ENFORCE_TYPES_STRATEGY", FULL.strategy),
+        sample_size=int(os.environ.get("ENFORCE_TYPES_SAMPLE_SIZE", FULL.sample_size)),
+        max_depth=int(max_depth) if max_depth else FULL.max_depth,
+    )
+
+
+# Process-wide switch. ENFORCE_TYPES=0 makes enforce_types return functions unchanged;
+# set_enabled(False) turns already decorated functions into passthroughs at runtime.
+_enabled = os.environ.get("ENFORCE_TYPES", "1").strip().lower() not in ("0", "false", "off", "no")
+
+
+def set_enabled(enabled: bool) -> None:
+    """Turn type enforcement on or off for the whole process."""
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled() -> bool:
+    """Return True if type enforcement is on."""
+    return _enabled
+
+
+class TypeViolation(TypeError):
+    """Raised (or recorded) when an argument or return value does not match its annotation."""
+
+    def __init__(self, message: str, argument: str):
+        super().__init__(message)
+        self.argument = argument
+
+
+class ViolationRegistry:
+    """
+    Thread-safe counters of type violations, keyed by (function, argument).
+
+    Functions decorated with on_violation="record" report here instead of raising;
+    the return value is reported under the argument name "return".
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+        self._last_errors: Dict[Tuple[str, str], str] = {}
+
+    def record(self, function: str, violation: TypeViolation) -> None:
+        key = (function, violation.argument)
+        with self._lock:
+            self._counts[key] += 1
+            self._last_errors[key] = str(violation)
+
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        """Return the number of violations per (function, argument)."""
+        with self._lock:
+            return dict(self._counts)
+
+    def last_error(self, function: str, argument: str) -> Optional[str]:
+        """Return the message of the most recent violation for (function, argument)."""
+        with self._lock:
+            return self._last_errors.get((function, argument))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+            self._last_errors.clear()
+
+
+violations = ViolationRegistry()
+
+
+def _accept_any(value: Any) -> bool:
+    return True
+
+
+def _sequence_selector(validation: Validation) -> Callable[[Any], Iterable]:
+    """Pick the elements of an indexable sequence to check."""
+    k = validation.sample_size
+    if validation.strategy == "first_k":
+        return lambda seq: islice(seq, k)
+    if validation.strategy == "random_k":
+        return lambda seq: seq if len(seq) <= k else (seq[i] for i in random.sample(range(len(seq)), k))
+    return lambda seq: seq
+
+
+def _iterable_selector(validation: Validation) -> Callable[[Any], Iterable]:
+    """Pick the elements of a non-indexable iterable (dict items, generic iterables) to check."""
+    k = validation.sample_size
+    if validation.strategy in ("first_k", "random_k"):
+        return lambda items: islice(items, k)
+    return lambda items: items
+
+
+def _build_checker(expected_type: Type, validation: Validation, depth: int) -> Checker:
+    """
+    Build a specialized checker closure for one (possibly parameterized) type.
+
+    All origin/argument lookups happen here, once; the returned closure only does
+    isinstance calls and calls to the checkers of the type arguments.
     """
+    if expected_type is Any:
+        return _accept_any
+
     origin = getattr(expected_type, "__origin__", None)
     args = getattr(expected_type, "__args__", None)
 
     if origin is None:
         # Handle simple types
-        return isinstance(value, expected_type)
+        return lambda value: isinstance(value, expected_type)
+
+    if origin in {Union}:
+        simple_types = tuple(arg for arg in args if getattr(arg, "__origin__", None) is None and isinstance(arg, type))
+        other_checkers = tuple(compile_checker(arg, validation, depth) for arg in args if arg not in simple_types)
+        return lambda value: isinstance(value, simple_types) or any(check(value) for check in other_checkers)
+
+    container = {List: list, Dict: dict, Tuple: tuple}.get(origin, origin)
+    if validation.strategy == "top_level" or (validation.max_depth is not None and depth >= validation.max_depth):
+        if isinstance(container, type):
+            return lambda value: isinstance(value, container)
+        return lambda value: isinstance(value, expected_type)
+
+    select_sequence = _sequence_selector(validation)
+    select_items = _iterable_selector(validation)
 
     if origin in {list, List}:
-        return isinstance(value, list) and all(
-            is_instance_of(item, args[0]) for item in value
-        )
+        check_item = compile_checker(args[0], validation, depth + 1)
+        return lambda value: isinstance(value, list) and all(map(check_item, select_sequence(value)))
     if origin in {dict, Dict}:
-        return isinstance(value, dict) and all(
-            is_instance_of(k, args[0]) and is_instance_of(v, args[1])
-            for k, v in value.items()
+        check_key = compile_checker(args[0], validation, depth + 1)
+        check_value = compile_checker(args[1], validation, depth + 1)
+        return lambda value: isinstance(value, dict) and all(
+            check_key(k) and check_value(v) for k, v in select_items(value.items())
         )
     if origin in {tuple, Tuple}:
-        return isinstance(value, tuple) and len(value) == len(args) and all(
-            is_instance_of(item, arg) for item, arg in zip(value, args)
+        item_checkers = tuple(compile_checker(arg, validation, depth + 1) for arg in args)
+        size = len(item_checkers)
+        return lambda value: isinstance(value, tuple) and len(value) == size and all(
+            check(item) for check, item in zip(item_checkers, value)
         )
     if origin in {collections.abc.Iterable}:
-        return isinstance(value, collections.abc.Iterable) and all(
-            is_instance_of(item, args[0]) for item in value
+        check_item = compile_checker(args[0], validation, depth + 1)
+        # One-shot iterators are not consumed here; enforce_types validates them lazily instead.
+        return lambda value: isinstance(value, collections.abc.Iterable) and (
+            isinstance(value, collections.abc.Iterator) or all(map(check_item, select_items(value)))
         )
-    if origin in {Union}:
-        return any(is_instance_of(value, arg) for arg in args)
+    if origin in LAZY_ORIGINS:
+        return lambda value: isinstance(value, origin)
 
     # Fallback to strict isinstance check
-    return isinstance(value, expected_type)
+    return lambda value: isinstance(value, expected_type)
+
+
+@lru_cache(maxsize=1024)
+def _compile_cached(expected_type: Type, validation: Validation, depth: int) -> Checker:
+    return _build_checker(expected_type, validation, depth)
 
 
-def enforce_types(func: Callable[..., Any]):
+def compile_checker(expected_type: Type, validation: Validation = FULL, depth: int = 0) -> Checker:
+    """
+    Return the checker for a type, compiling it on first use.
+
+    Compiled checkers are shared by all decorated functions through an LRU cache
+    keyed by the type object and the validation settings.
+
+    Args:
+        expected_type (Type): The expected type (possibly parameterized).
+        validation (Validation): How much of container values to check.
+        depth (int): Nesting depth of expected_type inside the top-level annotation.
+
+    Returns:
+        Checker: A function returning True if its argument matches the type.
+    """
+    try:
+        return _compile_cached(expected_type, validation, depth)
+    except TypeError:
+        # Unhashable annotation (e.g. Annotated with unhashable metadata): compile without caching
+        return _build_checker(expected_type, validation, depth)
+
+
+def is_instance_of(value: Any, expected_type: Type, validation: Validation = FULL) -> bool:
+    """
+    Check if the value matches the expected type, including parameterized generics.
+
+    Args:
+        value (Any): The value to check.
+        expected_type (Type): The expected type (possibly parameterized).
+        validation (Validation): How much of container values to check; everything by default.
+
+    Returns:
+        bool: True if value matches the type; False otherwise.
+    """
+    return compile_checker(expected_type, validation)(value)
+
+
+def enforce_types(func: Optional[Callable[..., Any]] = None, *, strategy: Optional[str] = None,
+                  sample_size: Optional[int] = None, max_depth: Optional[int] = None,
+                  sample_rate: Optional[float] = None, on_violation: Optional[str] = None):
     """
     A decorator to enforce type hints for a function's arguments and return value.
 
+    Each annotation is compiled into a checker once, at decoration time. Use it bare
+    (@enforce_types) or with arguments to bound the cost of checking large containers,
+    e.g. @enforce_types(strategy="first_k", sample_size=100, max_depth=2). Arguments
+    left out come from default_validation(); sample_rate and on_violation default to
+    ENFORCE_TYPES_SAMPLE_RATE and ENFORCE_TYPES_ON_VIOLATION.
+
     Args:
         func (callable): The function to wrap.
+        strategy (Optional[str]): One of STRATEGIES.
+        sample_size (Optional[int]): Number of elements checked by "first_k" and "random_k".
+        max_depth (Optional[int]): Nesting depth below which elements are not checked.
+        sample_rate (Optional[float]): Fraction of calls that are checked, from 0.0 to 1.0.
+        on_violation (Optional[str]): "raise" a TypeViolation, or "record" it in violations.
 
     Returns:
         callable: The wrapped function with type enforcement.
     """
+    defaults = default_validation()
+    validation = Validation(
+        strategy=strategy if strategy is not None else defaults.strategy,
+        sample_size=sample_size if sample_size is not None else defaults.sample_size,
+        max_depth=max_depth if max_depth is not None else defaults.max_depth,
+    )
+    if validation.strategy not in STRATEGIES:
+        raise ValueError(f"Unknown validation strategy {validation.strategy!r}; expected one of {STRATEGIES}.")
+    if sample_rate is None:
+        sample_rate = float(os.environ.get("ENFORCE_TYPES_SAMPLE_RATE", 1.0))
+    if not 0.0 <= sample_rate <= 1.0:
+        raise ValueError(f"sample_rate must be between 0.0 and 1.0, got {sample_rate}.")
+    if on_violation is None:
+        on_violation = os.environ.get("ENFORCE_TYPES_ON_VIOLATION", "raise")
+    if on_violation not in ("raise", "record"):
+        raise ValueError(f"on_violation must be 'raise' or 'record', got {on_violation!r}.")
+
+    def decorate(f: Callable[..., Any]):
+        if not _enabled:
+            return f  # Disabled for the process: no wrapper at all
+        return _enforce(f, validation, sample_rate=sample_rate, on_violation=on_violation)
+
+    if func is None:
+        return decorate
+    return decorate(func)
+
+
+class _ValidatingIterator(collections.abc.Iterator):
+    """Iterator proxy that validates each item as it is pulled, keeping streams lazy."""
+
+    def __init__(self, iterator: Iterator, check_item: Checker, limit: Optional[int],
+                 on_bad_item: Callable[[Any], None]):
+        self._iterator = iterator
+        self._check_item = check_item
+        self._remaining = limit
+        self._on_bad_item = on_bad_item
+
+    def __next__(self):
+        return self._validate(next(self._iterator))
+
+    def _validate(self, item: Any) -> Any:
+        if self._remaining is not None:
+            if self._remaining <= 0:
+                return item
+            self._remaining -= 1
+        if not self._check_item(item):
+            self._on_bad_item(item)
+        return item
+
+
+class _ValidatingGenerator(_ValidatingIterator, collections.abc.Generator):
+    """Generator proxy that also validates the items produced by send() and throw()."""
+
+    def send(self, value: Any) -> Any:
+        return self._validate(self._iterator.send(value))
+
+    def throw(self, *args: Any) -> Any:
+        return self._validate(self._iterator.throw(*args))
+
+    def close(self) -> None:
+        self._iterator.close()
+
+
+def _argument_error(name: str, expected_type: Type, value: Any) -> TypeViolation:
+    return TypeViolation(
+        f"Argument '{name}' must be of type {expected_type}, "
+        f"but got value {value!r} of type {type(value).__name__}.",
+        argument=name,
+    )
+
+
+def _enforce(func: Callable[..., Any], validation: Validation, fast_path: bool = True,
+             sample_rate: float = 1.0, on_violation: str = "raise"):
     type_hints = get_type_hints(func)
     sig = signature(func)
+    arg_checkers = {
+        name: (expected_type, compile_checker(expected_type, validation))
+        for name, expected_type in type_hints.items() if name != "return"
+    }
+    return_checker = compile_checker(type_hints["return"], validation) if "return" in type_hints else None
+    function_name = f"{func.__module__}.{func.__qualname__}"
+    record = on_violation == "record"
 
-    @wraps(func)
-    def wrapper(*args, **kwargs):
+    def lazy_wrapper(name: str, expected_type: Type) -> Optional[Callable[[Any], Any]]:
+        """Build the function that wraps iterator values of an Iterable/Iterator/Generator annotation."""
+        origin = getattr(expected_type, "__origin__", None)
+        args = getattr(expected_type, "__args__", None)
+        if origin not in LAZY_ORIGINS or not args or validation.strategy == "top_level" or validation.max_depth == 0:
+            return None
+        item_type = args[0]
+        check_item = compile_checker(item_type, validation, 1)
+        limit = None if validation.strategy == "full" else validation.sample_size
+        subject = "the return value" if name == "return" else f"argument '{name}'"
+
+        def on_bad_item(item: Any) -> None:
+            violation = TypeViolation(
+                f"Items of {subject} must be of type {item_type}, "
+                f"but got value {item!r} of type {type(item).__name__}.",
+                argument=name,
+            )
+            if not record:
+                raise violation
+            violations.record(function_name, violation)
+
+        def wrap(value: Any) -> Any:
+            if isinstance(value, collections.abc.Generator):
+                return _ValidatingGenerator(value, check_item, limit, on_bad_item)
+            if isinstance(value, collections.abc.Iterator):
+                return _ValidatingIterator(value, check_item, limit, on_bad_item)
+            return value  # Re-iterable collections were already checked eagerly
+
+        return wrap
+
+    # Precomputed plan for calls without *args/**kwargs parameters: checkers by position
+    # and by keyword, plus the parameters whose default value itself fails its check.
+    params = list(sig.parameters.values())
+    simple_signature = fast_path and all(
+        p.kind in (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD, Parameter.KEYWORD_ONLY)
+        for p in params
+    )
+    param_names = [p.name for p in params]
+    num_params = len(params)
+    num_positional = sum(p.kind != Parameter.KEYWORD_ONLY for p in params)
+    positional_checkers = tuple((p.name,) + arg_checkers[p.name] if p.name in arg_checkers else None for p in params)
+    keyword_index = {p.name: i for i, p in enumerate(params) if p.kind != Parameter.POSITIONAL_ONLY}
+    lazy_params = {
+        p.name: (i if p.kind in (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD) else None, wrap)
+        for i, p in enumerate(params)
+        if p.kind not in (Parameter.VAR_POSITIONAL, Parameter.VAR_KEYWORD) and p.name in arg_checkers
+        for wrap in [lazy_wrapper(p.name, arg_checkers[p.name][0])] if wrap is not None
+    }
+    wrap_return = lazy_wrapper("return", type_hints["return"]) if "return" in type_hints else None
+    required = frozenset(p.name for p in params if p.default is Parameter.empty)
+    bad_defaults = {
+        p.name: p.default for p in params
+        if p.default is not Parameter.empty and p.name in arg_checkers and not arg_checkers[p.name][1](p.default)
+    }
+
+    def check_fast(args, kwargs) -> bool:
+        """Validate the arguments without binding them; return False if the call needs bind()."""
+        num_args = len(args)
+        if num_args > num_positional:
+            return False
+        for plan, value in zip(positional_checkers, args):
+            if plan is not None and not plan[2](value):
+                raise _argument_error(plan[0], plan[1], value)
+        if kwargs:
+            for name, value in kwargs.items():
+                i = keyword_index.get(name)
+                if i is None or i < num_args:
+                    return False  # Unknown or duplicate argument: let bind() raise
+                plan = positional_checkers[i]
+                if plan is not None and not plan[2](value):
+                    raise _argument_error(name, plan[1], value)
+        if num_args + len(kwargs) < num_params:
+            for name in param_names[num_args:]:
+                if name not in kwargs:
+                    if name in required:
+                        return False  # Missing argument: let bind() raise
+                    if name in bad_defaults:
+                        raise _argument_error(name, arg_checkers[name][0], bad_defaults[name])
+        return True
+
+    def check_bound(args, kwargs) -> None:
         bound_args = sig.bind(*args, **kwargs)
         bound_args.apply_defaults()
 
         # Validate argument types
         for name, value in bound_args.arguments.items():
-            if name in type_hints:
-                expected_type = type_hints[name]
-                if not is_instance_of(value, expected_type):
-                    raise TypeError(
-                        f"Argument '{name}' must be of type {expected_type}, "
-                        f"but got value {value!r} of type {type(value).__name__}."
-                    )
+            if name in arg_checkers:
+                expected_type, check = arg_checkers[name]
+                if not check(value):
+                    raise _argument_error(name, expected_type, value)
+
+    def wrap_lazy_args(args, kwargs):
+        """Replace iterator arguments by validating proxies."""
+        args = list(args)
+        for name, (i, wrap) in lazy_params.items():
+            if i is not None and i < len(args):
+                args[i] = wrap(args[i])
+            elif name in kwargs:
+                kwargs[name] = wrap(kwargs[name])
+        return args, kwargs
+
+    sampled = sample_rate < 1.0
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled or (sampled and random.random() >= sample_rate):
+            return func(*args, **kwargs)
+
+        try:
+            if not (simple_signature and check_fast(args, kwargs)):
+                check_bound(args, kwargs)
+        except TypeViolation as violation:
+            if not record:
+                raise
+            violations.record(function_name, violation)
+
+        if lazy_params:
+            args, kwargs = wrap_lazy_args(args, kwargs)
 
         result = func(*args, **kwargs)
 
         # Validate return type
-        if "return" in type_hints:
-            expected_return_type = type_hints["return"]
-            if not is_instance_of(result, expected_return_type):
-                raise TypeError(
-                    f"Return value must be of type {expected_return_type}, "
-                    f"but got value {result!r} of type {type(result).__name__}."
+        if return_checker is not None:
+            if not return_checker(result):
+                violation = TypeViolation(
+                    f"Return value must be of type {type_hints['return']}, "
+                    f"but got value {result!r} of type {type(result).__name__}.",
+                    argument="return",
                 )
+                if not record:
+                    raise violation
+                violations.record(function_name, violation)
+            if wrap_return is not None:
+                result = wrap_return(result)
 
         return result
 
     return wrapper
 
 
+def benchmark(number: int = 200_000) -> None:
+    """
+    Time a small function undecorated, through the fast path and through sig.bind.
+
+    Args:
+        number (int): Calls per measurement.
+    """
+    import timeit
+
+    def scale(x: int, factor: float = 2.0, label: str = "") -> float:
+        return x * factor
+
+    fast = _enforce(scale, FULL)
+    bound = _enforce(scale, FULL, fast_path=False)
+    cases = [
+        ("positional", lambda f: f(3, 1.5)),
+        ("keyword", lambda f: f(3, factor=1.5, label="x")),
+    ]
+    for name, call in cases:
+        plain_time = min(timeit.repeat(lambda: call(scale), number=number, repeat=3))
+        fast_time = min(timeit.repeat(lambda: call(fast), number=number, repeat=3))
+        bound_time = min(timeit.repeat(lambda: call(bound), number=number, repeat=3))
+        per_call = 1e9 / number
+        print(f"{name} call ({number} calls):")
+        print(f"  undecorated: {plain_time * per_call:7.0f} ns/call")
+        print(f"  fast path:   {fast_time * per_call:7.0f} ns/call")
+        print(f"  sig.bind:    {bound_time * per_call:7.0f} ns/call")
+
+
 # Example usage
 @enforce_types
 def greet(name: str) -> str:
@@ -111,10 +532,39 @@ def complex_func(data: Dict[str, List[int]]) -> Tuple[str, int]:
     return list(data.keys())[0], sum(sum(data.values(), []))
 
 
+@enforce_types(strategy="first_k", sample_size=100, max_depth=2)
+def total_rows(rows: List[List[int]]) -> int:
+    return sum(map(sum, rows))
+
+
+@enforce_types
+def running_total(numbers: Iterator[int]) -> Generator[int, None, None]:
+    total = 0
+    for number in numbers:
+        total += number
+        yield total
+
+
+@enforce_types(sample_rate=0.5, on_violation="record")
+def half(value: int) -> int:
+    return value // 2
+
+
 # Testing
 if __name__ == "__main__":
+    import sys
+
+    if "--benchmark" in sys.argv:
+        benchmark()
+        sys.exit(0)
+
     print(greet("Alice"))  # Works fine
     print(add(3, 5))       # Gives error
     process_items([1, 2, 3])  # Works fine
     print(complex_func({"key1": [1, 2], "key2": [3, 4]}))  # Works fine
+    print(total_rows([[1, 2, 3]] * 1_000_000))  # Checks only 100 rows of 3 items
+    for _ in range(100):
+        half(3.0)  # Recorded instead of raised, about half of the calls
+    print(violations.counts())
+    print(list(running_total(x for x in range(5))))  # Validated lazily, item by item
     complex_func({"key1": [1, "two"]})  # Raises TypeError
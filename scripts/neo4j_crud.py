@@ -4,19 +4,39 @@
 # python neo4j_crud_tool.py create Person --props name=Alice age=30
 # Read Nodes:
 # python neo4j_crud_tool.py read Person
+# Read selected properties, one page at a time (continue with --after <last id>):
+# python neo4j_crud_tool.py read Person --props name age --limit 1000 --after 12345
 # Update a Node:
 # python neo4j_crud_tool.py update Person --match name=Alice --props age=31
 # python neo4j_crud_tool.py update Person --match name=Alice --props age=31
 # Delete a Node:
 # python neo4j_crud_tool.py delete Person --match name=Alice
+# Bulk-create Nodes from a CSV (header row = property names) or JSONL file:
+# python neo4j_crud_tool.py bulk-create Person --file people.jsonl --batch-size 5000
+# Bulk-update or bulk-delete Nodes matched by a key column of a CSV/JSONL file, with 4 concurrent sessions:
+# python neo4j_crud_tool.py bulk-update Person --key email --file changes.csv --workers 4
+# python neo4j_crud_tool.py bulk-delete Person --key email --file leavers.csv --workers 4
+# Run many commands, one per line, over one pooled connection (interactive or piped):
+# printf 'create Person --props name=Bob\nread Person\n' | python neo4j_crud_tool.py shell --max-pool-size 10
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from neo4j import GraphDatabase
+from neo4j.exceptions import ServiceUnavailable, SessionExpired, TransientError
 import argparse
+import csv
+import itertools
+import json
+import shlex
+import sys
+import time
+
+RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
 
 
 class Neo4jCRUDTool:
-    def __init__(self, uri, user, password):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+    def __init__(self, uri, user, password, **driver_config):
+        # driver_config: e.g. max_connection_pool_size, max_connection_lifetime
+        self.driver = GraphDatabase.driver(uri, auth=(user, password), **driver_config)
 
     def close(self):
         self.driver.close()
@@ -32,16 +52,121 @@ class Neo4jCRUDTool:
         result = tx.run(query, **properties)
         return result.single()[0]
 
-    def read_nodes(self, label):
-        with self.driver.session() as session:
-            result = session.read_transaction(self._read_nodes, label)
-            for record in result:
+    def _run_batches(self, verb, transaction_function, label, rows, batch_size, workers=1, retries=0, extra_args=()):
+        # Each batch is its own write transaction, so no single transaction holds the whole load.
+        # Batches run on `workers` concurrent sessions; at most 2 * workers are read ahead of the pool.
+        # write_transaction already retries transient errors; `retries` adds whole-batch retries on top,
+        # which is only safe for idempotent batches since a lost connection may hide a committed one.
+        def run_batch(batch):
+            for attempt in range(retries + 1):
+                try:
+                    with self.driver.session() as session:
+                        return session.write_transaction(transaction_function, label, batch, *extra_args)
+                except RETRYABLE_ERRORS as e:
+                    if attempt == retries:
+                        raise
+                    delay = 2 ** attempt
+                    print(f"Transient error ({e.__class__.__name__}), retrying batch in {delay}s")
+                    time.sleep(delay)
+
+        done_count = 0
+        started = time.perf_counter()
+        rows = iter(rows)
+        batches = iter(lambda: list(itertools.islice(rows, batch_size)), [])
+
+        def report(finished):
+            nonlocal done_count
+            for future in finished:
+                done_count += future.result()
+            elapsed = time.perf_counter() - started
+            print(f"{verb} {done_count} nodes in {elapsed:.1f}s ({done_count / elapsed:.0f} nodes/s)")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight = set()
+            for batch in batches:
+                if len(in_flight) >= 2 * workers:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    report(finished)
+                in_flight.add(executor.submit(run_batch, batch))
+            if in_flight:
+                report(wait(in_flight).done)
+        return done_count
+
+    def bulk_create_nodes(self, label, rows, batch_size=1000, workers=1):
+        # One UNWIND query per batch instead of one transaction per node.
+        # No batch retries: re-running a CREATE batch that was committed would duplicate its nodes
+        return self._run_batches("Created", self._bulk_create_nodes, label, rows, batch_size, workers)
+
+    def bulk_update_nodes(self, label, match_key, rows, batch_size=1000, workers=1, retries=3):
+        # Each row holds the match key and the properties to set
+        return self._run_batches("Updated", self._bulk_update_nodes, label, rows, batch_size, workers, retries,
+                                 (match_key,))
+
+    def bulk_delete_nodes(self, label, match_key, rows, batch_size=1000, workers=1, retries=3):
+        keys = ({match_key: row[match_key]} for row in rows)
+        return self._run_batches("Deleted", self._bulk_delete_nodes, label, keys, batch_size, workers, retries,
+                                 (match_key,))
+
+    @staticmethod
+    def _bulk_create_nodes(tx, label, batch):
+        query = f"UNWIND $rows AS row CREATE (n:{label}) SET n = row RETURN count(n)"
+        result = tx.run(query, rows=batch)
+        return result.single()[0]
+
+    @staticmethod
+    def _bulk_update_nodes(tx, label, batch, match_key):
+        query = (
+            f"UNWIND $rows AS row "
+            f"MATCH (n:{label} {{`{match_key}`: row.`{match_key}`}}) "
+            f"SET n += row "
+            f"RETURN count(n)"
+        )
+        result = tx.run(query, rows=batch)
+        return result.single()[0]
+
+    @staticmethod
+    def _bulk_delete_nodes(tx, label, batch, match_key):
+        query = (
+            f"UNWIND $rows AS row "
+            f"MATCH (n:{label} {{`{match_key}`: row.`{match_key}`}}) "
+            f"DETACH DELETE n "
+            f"RETURN count(n)"
+        )
+        result = tx.run(query, rows=batch)
+        return result.single()[0]
+
+    def read_nodes(self, label, properties=None, skip=None, limit=None, after_id=None, fetch_size=1000):
+        query, params = self._read_nodes_query(label, properties, skip, limit, after_id)
+        with self.driver.session(fetch_size=fetch_size) as session:
+            # Auto-commit query: records are pulled fetch_size at a time and printed as they
+            # arrive, so memory stays constant and the first result shows up immediately
+            for record in session.run(query, **params):
                 print(record)
 
     @staticmethod
-    def _read_nodes(tx, label):
-        query = f"MATCH (n:{label}) RETURN n"
-        return list(tx.run(query))
+    def _read_nodes_query(label, properties=None, skip=None, limit=None, after_id=None):
+        query = f"MATCH (n:{label})"
+        params = {}
+        if after_id is not None:
+            # Keyset pagination: cheaper than SKIP on deep pages
+            query += " WHERE id(n) > $after_id"
+            params["after_id"] = after_id
+        if properties:
+            projection = ", ".join(f"n.`{p}` AS `{p}`" for p in properties)
+            query += f" RETURN id(n) AS id, {projection}"
+            order_by = "id"
+        else:
+            query += " RETURN n"
+            order_by = "id(n)"
+        if skip is not None or limit is not None or after_id is not None:
+            query += f" ORDER BY {order_by}"
+        if skip is not None:
+            query += " SKIP $skip"
+            params["skip"] = skip
+        if limit is not None:
+            query += " LIMIT $limit"
+            params["limit"] = limit
+        return query, params
 
     def update_node(self, label, match_property, update_properties):
         with self.driver.session() as session:
@@ -74,19 +199,127 @@ class Neo4jCRUDTool:
         return result.single()[0]
 
 
-def parse_arguments():
+OPERATIONS = ["create", "read", "update", "delete", "bulk-create", "bulk-update", "bulk-delete"]
+
+
+def build_parser(operations):
     parser = argparse.ArgumentParser(description="Neo4j CLI CRUD Tool")
-    parser.add_argument("operation", choices=["create", "read", "update", "delete"], help="CRUD operation")
-    parser.add_argument("label", help="Node label (e.g., Person, Product)")
-    parser.add_argument("--props", nargs="+", help="Properties for creating or updating (e.g., name=Alice age=30)")
+    parser.add_argument("operation", choices=operations, help="CRUD operation")
+    parser.add_argument("label", nargs="?", help="Node label (e.g., Person, Product)")
+    parser.add_argument("--props", nargs="+",
+                        help="Properties for creating or updating (e.g., name=Alice age=30), "
+                             "or property names to return for read (e.g., name age)")
     parser.add_argument("--match", nargs="+", help="Property to match node for update/delete (e.g., name=Alice)")
-    return parser.parse_args()
+    parser.add_argument("--file", help="CSV or JSONL file with one node per row for bulk operations")
+    parser.add_argument("--key", help="Property of each row used to match nodes for bulk-update/bulk-delete")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Nodes per transaction for bulk operations")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent sessions for bulk operations")
+    parser.add_argument("--retries", type=int, default=3,
+                        help="Retries of a bulk-update/bulk-delete batch after a transient error")
+    parser.add_argument("--skip", type=int, help="Number of nodes to skip for read")
+    parser.add_argument("--limit", type=int, help="Maximum number of nodes to return for read")
+    parser.add_argument("--after", type=int, help="Return only nodes with an internal id greater than this for read")
+    parser.add_argument("--fetch-size", type=int, default=1000, help="Records fetched per round-trip for read")
+    return parser
+
+
+def parse_arguments():
+    parser = build_parser(OPERATIONS + ["shell"])
+    parser.add_argument("--max-pool-size", type=int, default=100, help="Maximum pooled connections")
+    parser.add_argument("--max-connection-lifetime", type=float, default=3600,
+                        help="Seconds after which a pooled connection is replaced")
+    args = parser.parse_args()
+    if args.operation != "shell":
+        check_arguments(parser, args)
+    return args
+
+
+def check_arguments(parser, args):
+    # Options each operation cannot run without; parser.error exits with the usage message
+    required = {
+        "create": ["props"],
+        "update": ["match", "props"],
+        "delete": ["match"],
+        "bulk-create": ["file"],
+        "bulk-update": ["key", "file"],
+        "bulk-delete": ["key", "file"],
+    }
+    if not args.label:
+        parser.error("the label argument is required")
+    for option in required.get(args.operation, []):
+        if not getattr(args, option):
+            parser.error(f"--{option} is required for {args.operation}")
 
 
 def parse_properties(props):
     return {k: v for prop in props for k, v in [prop.split("=")]}
 
 
+def read_rows(path):
+    # JSONL keeps value types; CSV values are strings, keyed by the header row
+    with open(path, newline="") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def run_command(tool, args):
+    if args.operation == "create":
+        properties = parse_properties(args.props)
+        tool.create_node(args.label, properties)
+
+    elif args.operation == "read":
+        tool.read_nodes(args.label, args.props, args.skip, args.limit, args.after, args.fetch_size)
+
+    elif args.operation == "update":
+        match_property = parse_properties(args.match)
+        update_properties = parse_properties(args.props)
+        tool.update_node(args.label, match_property, update_properties)
+
+    elif args.operation == "delete":
+        match_property = parse_properties(args.match)
+        tool.delete_node(args.label, match_property)
+
+    elif args.operation == "bulk-create":
+        created = tool.bulk_create_nodes(args.label, read_rows(args.file), args.batch_size, args.workers)
+        print("Nodes created:", created)
+
+    elif args.operation == "bulk-update":
+        updated = tool.bulk_update_nodes(args.label, args.key, read_rows(args.file), args.batch_size,
+                                         args.workers, args.retries)
+        print("Updated nodes:", updated)
+
+    elif args.operation == "bulk-delete":
+        deleted = tool.bulk_delete_nodes(args.label, args.key, read_rows(args.file), args.batch_size,
+                                         args.workers, args.retries)
+        print("Deleted nodes:", deleted)
+
+
+def run_shell(tool, lines, interactive=False):
+    # Every line is a regular command ("create Person --props name=Alice"); they all share
+    # the tool's pooled driver, so the connection handshake and auth happen only once.
+    parser = build_parser(OPERATIONS)
+    if interactive:
+        print("Neo4j CRUD shell. One command per line, e.g. 'read Person --limit 10'; 'exit' to quit.")
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line in ("exit", "quit"):
+            break
+        try:
+            args = parser.parse_args(shlex.split(line))
+            check_arguments(parser, args)
+            run_command(tool, args)
+        except SystemExit:
+            pass  # argparse already printed the usage error; keep reading commands
+        except Exception as e:
+            print(f"Error: {e}")
+
+
 def main():
     args = parse_arguments()
 
@@ -94,24 +327,19 @@ def main():
     user = "neo4j"
     password = "password"  # Change to your Neo4j password
 
-    tool = Neo4jCRUDTool(uri, user, password)
+    tool = Neo4jCRUDTool(uri, user, password, max_connection_pool_size=args.max_pool_size,
+                         max_connection_lifetime=args.max_connection_lifetime)
 
     try:
-        if args.operation == "create":
-            properties = parse_properties(args.props)
-            tool.create_node(args.label, properties)
-
-        elif args.operation == "read":
-            tool.read_nodes(args.label)
-
-        elif args.operation == "update":
-            match_property = parse_properties(args.match)
-            update_properties = parse_properties(args.props)
-            tool.update_node(args.label, match_property, update_properties)
-
-        elif args.operation == "delete":
-            match_property = parse_properties(args.match)
-            tool.delete_node(args.label, match_property)
+        if args.operation == "shell":
+            interactive = sys.stdin.isatty()
+            lines = iter(lambda: input("neo4j> ") + "\n", None) if interactive else sys.stdin
+            try:
+                run_shell(tool, lines, interactive)
+            except EOFError:
+                print()
+        else:
+            run_command(tool, args)
 
     finally:
         tool.close()
@@ -1,37 +1,110 @@
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
+# Moves are I/O bound (metadata round-trips on network filesystems), so threads help
+DEFAULT_WORKERS = 16
 
-def organize_files_by_extension(folder_name):
-    if not os.path.exists(folder_name):
+
+def extension_folder(filename):
+    # Get the file extension (e.g., ".txt", ".jpg") without the dot
+    file_extension = os.path.splitext(filename)[1].lower()[1:]
+    # Files without an extension go to the 'no_extension' folder
+    return file_extension or "no_extension"
+
+
+def plan_moves(folder_name):
+    """Group the files directly inside folder_name by destination folder in a single directory scan."""
+    plan = {}
+    with os.scandir(folder_name) as entries:
+        for entry in entries:
+            # Skip directories, we are only organizing files; DirEntry caches the type, so no extra stat
+            if entry.is_file():
+                plan.setdefault(extension_folder(entry.name), []).append(entry.name)
+    return plan
+
+
+def move_file(source, destination, same_device):
+    if same_device:
+        os.rename(source, destination)
+    else:
+        # The extension folder is a mount point: fall back to copy and delete
+        shutil.move(source, destination)
+
+
+def organize_files_by_extension(folder_name, workers=DEFAULT_WORKERS, verbose=False):
+    """Move each file in folder_name into a sub-folder named after its extension; return the number moved."""
+    if not os.path.isdir(folder_name):
         print(f"The folder {folder_name} does not exist.")
-        return
+        return 0
 
-    for filename in os.listdir(folder_name):
-        file_path = os.path.join(folder_name, filename)
+    plan = plan_moves(folder_name)
+    folder_device = os.stat(folder_name).st_dev
 
-        # Skip directories, we are only organizing files
-        if os.path.isfile(file_path):
-            # Get the file extension (e.g., ".txt", ".jpg")
-            file_extension = os.path.splitext(filename)[1].lower()[1:]  # Get extension without a dot
+    # Create each extension folder once, up front, instead of checking it for every file
+    tasks = []
+    for extension, filenames in plan.items():
+        destination_folder = os.path.join(folder_name, extension)
+        os.makedirs(destination_folder, exist_ok=True)
+        same_device = os.stat(destination_folder).st_dev == folder_device
+        tasks.extend(
+            (os.path.join(folder_name, filename), os.path.join(destination_folder, filename), same_device)
+            for filename in filenames
+        )
 
-            # If the file has no extension, move it to 'no_extension' folder
-            if not file_extension:
-                file_extension = "no_extension"
+    moved = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(move_file, *task) for task in tasks]
+        for (source, destination, _), future in zip(tasks, futures):
+            try:
+                future.result()
+            except OSError as e:
+                print(f"Could not move {source}: {e}")
+                continue
+            moved += 1
+            if verbose:
+                print(f"Moved {os.path.basename(source)} to {os.path.dirname(destination)}")
 
-            # Create a directory for this extension if it doesn't exist
-            destination_folder = os.path.join(folder_name, file_extension)  # Skip the dot in extension
-            if not os.path.exists(destination_folder):
-                os.makedirs(destination_folder)
+    print(f"Moved {moved} files into {len(plan)} folders.")
+    return moved
 
-            # Move the file to the destination folder
-            shutil.move(file_path, os.path.join(destination_folder, filename))
-            print(f"Moved {filename} to {destination_folder}")
+
+def benchmark(num_files=20000, workers=DEFAULT_WORKERS):
+    """Time organizing a temporary folder of num_files files, single-threaded and with workers threads."""
+    import tempfile
+    import time
+
+    extensions = ["txt", "jpg", "png", "pdf", "csv", "py", ""]
+    for label, thread_count in (("1 thread", 1), (f"{workers} threads", workers)):
+        with tempfile.TemporaryDirectory() as folder:
+            for i in range(num_files):
+                extension = extensions[i % len(extensions)]
+                open(os.path.join(folder, f"file_{i}.{extension}" if extension else f"file_{i}"), "w").close()
+
+            start = time.perf_counter()
+            organize_files_by_extension(folder, workers=thread_count)
+            elapsed = time.perf_counter() - start
+            print(f"  {label}: {elapsed:.3f}s ({num_files / elapsed:,.0f} files/sec)")
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Move files into sub-folders named after their extensions.")
+    parser.add_argument("folder", nargs="?", help="Folder to organize (prompted for if omitted).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Number of threads moving files (default: {DEFAULT_WORKERS}).")
+    parser.add_argument("--verbose", action="store_true", help="Print every move.")
+    parser.add_argument("--benchmark", type=int, metavar="N",
+                        help="Benchmark organizing a temporary folder of N files and exit.")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.workers)
+        raise SystemExit(0)
+
     # Path to the folder you want to organize
-    source_folder = input("Enter the path to the folder you want to organize: ").strip()
+    source_folder = args.folder or input("Enter the path to the folder you want to organize: ").strip()
 
     # Organize files by their extensions
-    organize_files_by_extension(source_folder)
+    organize_files_by_extension(source_folder, workers=args.workers, verbose=args.verbose)
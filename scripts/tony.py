@@ -2,38 +2,408 @@
 # pip install clickhouse-connect
 # curl https://clickhouse.com/ | sh
 # ./clickhouse server
+# Or run it without a server: python tony.py --backend sqlite
 
-import clickhouse_connect
+import argparse
+import atexit
+import os
+import queue
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
 
-# Initialize the ClickHouse client
-client = clickhouse_connect.get_client(host='localhost', port=8123, username='default', password='')
+HISTORY_PAGE_SIZE = 20
+HISTORY_DEFAULT_DAYS = 7
 
-# Create the stress_events table if it doesn't exist
-client.command("""
-CREATE TABLE IF NOT EXISTS stress_events (
-    id UInt64,
-    event String,
-    level UInt8,
-    timestamp DateTime DEFAULT now()
-) ENGINE = MergeTree()
-ORDER BY id
-""")
 
+class ClickHouseBackend:
+    """Store events in ClickHouse; the client and schema are set up on first use."""
 
-def save_to_clickhouse(event, level):
-    """Save a stress event to the ClickHouse database."""
-    # Fetch the current maximum ID from the table or set it to 0
-    last_id = client.query("SELECT max(id) FROM stress_events").result_rows[0][0] or 0
-    new_id = last_id + 1
+    def __init__(self, host='localhost', port=8123, username='default', password=''):
+        self.settings = dict(host=host, port=port, username=username, password=password)
+        self._client = None
+        self._lock = threading.Lock()
 
-    query = "INSERT INTO stress_events (id, event, level) VALUES (%s, %s, %s)"
-    parameters = (new_id, event, level)
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                import clickhouse_connect
 
-    try:
-        client.command(query, parameters)
-        print(f"Event saved to ClickHouse: '{event}' with stress level {level}/10.\n")
-    except Exception as e:
-        print(f"Error saving to ClickHouse: {e}")
+                client = clickhouse_connect.get_client(**self.settings)
+                self.create_schema(client)
+                self._client = client
+            return self._client
+
+    def create_schema(self, client):
+        """Create the events table and the daily aggregate that the analysis reads from."""
+        # Sorted by (timestamp, id) so time-window scans use the primary index
+        client.command("""
+        CREATE TABLE IF NOT EXISTS stress_events (
+            id UInt64,
+            event String,
+            level UInt8,
+            timestamp DateTime DEFAULT now()
+        ) ENGINE = MergeTree()
+        ORDER BY (timestamp, id)
+        """)
+        self.migrate_sort_key(client)
+
+        # One row per day after merges: avg/count states, finalized with avgMerge/countMerge at read time
+        client.command("""
+        CREATE TABLE IF NOT EXISTS stress_daily (
+            day Date,
+            avg_level AggregateFunction(avg, UInt8),
+            events AggregateFunction(count)
+        ) ENGINE = AggregatingMergeTree()
+        ORDER BY day
+        """)
+        if client.command("EXISTS TABLE stress_daily_mv"):
+            return
+
+        # The view only sees new inserts, so the events already recorded are backfilled. A cutoff
+        # splits the two by timestamp: the view takes events at or after it, the backfill those
+        # before it, so an event inserted while this runs is counted exactly once. Rows stamped
+        # before the cutoff but inserted later (e.g. by a writer still running an older version
+        # during the first start, or an import of old events) are not aggregated.
+        cutoff = client.command("SELECT toString(now())")
+        client.command("TRUNCATE TABLE stress_daily")  # Left over from an interrupted first start, if anything
+        client.command(f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS stress_daily_mv TO stress_daily AS
+        SELECT toDate(timestamp) AS day, avgState(level) AS avg_level, countState() AS events
+        FROM stress_events
+        WHERE timestamp >= toDateTime('{cutoff}')
+        GROUP BY day
+        """)
+        client.command(f"""
+        INSERT INTO stress_daily
+        SELECT toDate(timestamp) AS day, avgState(level), countState()
+        FROM stress_events
+        WHERE timestamp < toDateTime('{cutoff}')
+        GROUP BY day
+        """)
+
+    @staticmethod
+    def migrate_sort_key(client):
+        """Rebuild a stress_events table created with the old ORDER BY id layout."""
+        sorting_key = client.query(
+            "SELECT sorting_key FROM system.tables WHERE database = currentDatabase() AND name = 'stress_events'"
+        ).result_rows[0][0]
+        if sorting_key.replace(" ", "") == "timestamp,id":
+            return
+
+        print("Migrating stress_events to ORDER BY (timestamp, id)...")
+        client.command("DROP TABLE IF EXISTS stress_events_migration")
+        client.command("CREATE TABLE stress_events_migration AS stress_events ENGINE = MergeTree() ORDER BY (timestamp, id)")
+        client.command("INSERT INTO stress_events_migration SELECT * FROM stress_events")
+        client.command("EXCHANGE TABLES stress_events AND stress_events_migration")
+        client.command("DROP TABLE stress_events_migration")
+
+    def insert_events(self, rows):
+        columns = [list(column) for column in zip(*rows)]
+        self.client.insert("stress_events", columns, column_names=["id", "event", "level", "timestamp"],
+                           column_oriented=True)
+
+    def fetch_page(self, since, after, limit):
+        query = "SELECT id, event, level, timestamp FROM stress_events WHERE timestamp >= %(since)s"
+        parameters = {"since": since, "limit": limit}
+        if after is not None:
+            # Keyset pagination: the (timestamp, id) prefix of the sort key makes this a range seek, not an OFFSET scan
+            query += " AND (timestamp, id) > (%(after_timestamp)s, %(after_id)s)"
+            parameters.update(after_timestamp=after[0], after_id=after[1])
+        query += " ORDER BY timestamp, id LIMIT %(limit)s"
+        return self.client.query(query, parameters=parameters).result_rows
+
+    def summary(self):
+        # Read the per-day aggregate states instead of scanning every event
+        return tuple(self.client.query(
+            "SELECT avgMerge(avg_level), countMerge(events) FROM stress_daily"
+        ).result_rows[0])
+
+
+class SQLiteBackend:
+    """Store events in a local SQLite file (or ":memory:"); no server needed."""
+
+    def __init__(self, path="tony.db"):
+        self.path = path
+        self._connection = None
+        # The writer thread and the menu share one connection
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.create_schema(connection)
+            self._connection = connection
+        return self._connection
+
+    @staticmethod
+    def create_schema(connection):
+        # stress_daily plays the role of the ClickHouse aggregate: a trigger keeps per-day sums up to date
+        connection.executescript("""
+        CREATE TABLE IF NOT EXISTS stress_events (
+            id INTEGER PRIMARY KEY,
+            event TEXT NOT NULL,
+            level INTEGER NOT NULL,
+            timestamp TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS stress_events_timestamp_id ON stress_events (timestamp, id);
+        CREATE TABLE IF NOT EXISTS stress_daily (
+            day TEXT PRIMARY KEY,
+            level_sum INTEGER NOT NULL,
+            events INTEGER NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS stress_daily_insert AFTER INSERT ON stress_events
+        BEGIN
+            INSERT INTO stress_daily (day, level_sum, events) VALUES (date(NEW.timestamp), NEW.level, 1)
+            ON CONFLICT (day) DO UPDATE SET level_sum = level_sum + NEW.level, events = events + 1;
+        END;
+        """)
+
+    @staticmethod
+    def _format(timestamp):
+        # ISO text sorts the same way as the datetimes it encodes
+        return timestamp.isoformat(" ", "seconds") if isinstance(timestamp, datetime) else timestamp
+
+    def insert_events(self, rows):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT INTO stress_events (id, event, level, timestamp) VALUES (?, ?, ?, ?)",
+                    [(event_id, event, level, self._format(timestamp)) for event_id, event, level, timestamp in rows],
+                )
+
+    def fetch_page(self, since, after, limit):
+        query = "SELECT id, event, level, timestamp FROM stress_events WHERE timestamp >= ?"
+        parameters = [self._format(since)]
+        if after is not None:
+            query += " AND (timestamp, id) > (?, ?)"
+            parameters += [self._format(after[0]), after[1]]
+        query += " ORDER BY timestamp, id LIMIT ?"
+        with self._lock:
+            return self._connect().execute(query, parameters + [limit]).fetchall()
+
+    def summary(self):
+        with self._lock:
+            level_sum, total = self._connect().execute(
+                "SELECT SUM(level_sum), SUM(events) FROM stress_daily"
+            ).fetchone()
+        return (level_sum / total if total else None), total or 0
+
+
+# A backend is any object with insert_events(rows), fetch_page(since, after, limit) and summary()
+BACKENDS = {"clickhouse": ClickHouseBackend, "sqlite": SQLiteBackend}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the shared backend, creating it from TONY_BACKEND/TONY_SQLITE_PATH on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = os.environ.get("TONY_BACKEND", "clickhouse")
+            if name == "sqlite":
+                _backend = SQLiteBackend(os.environ.get("TONY_SQLITE_PATH", "tony.db"))
+            elif name in BACKENDS:
+                _backend = BACKENDS[name]()
+            else:
+                raise ValueError(f"Unknown backend {name!r}, expected one of: {', '.join(BACKENDS)}.")
+        return _backend
+
+
+def set_backend(backend):
+    """Use backend for all following reads and writes."""
+    global _backend, _event_writer
+    with _backend_lock:
+        if _event_writer is not None:
+            _event_writer.close()
+            _event_writer = None
+        _backend = backend
+
+
+class SnowflakeIdGenerator:
+    """
+    Generate unique, time-ordered 64-bit IDs without asking the database.
+
+    Layout: 41 bits of milliseconds since EPOCH_MS, 10 bits of worker id, 12 bits of
+    sequence within the millisecond. Processes writing concurrently must have different
+    worker ids. The worker id is TONY_WORKER_ID (0-1023) if set; otherwise one is leased by
+    locking a file in TONY_WORKER_LEASE_DIR (default: <tmp>/tony-worker-ids), which keeps
+    processes on one host apart and is released when the process exits. Writers on several
+    hosts need distinct TONY_WORKER_IDs or a lease directory on shared storage. Only when
+    no lease can be taken is a random id used, with a warning, as it may collide.
+    """
+
+    EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+    WORKER_BITS = 10
+    SEQUENCE_BITS = 12
+
+    def __init__(self, worker_id=None):
+        self._lease = None
+        if worker_id is None and "TONY_WORKER_ID" in os.environ:
+            worker_id = int(os.environ["TONY_WORKER_ID"])
+        if worker_id is None:
+            lease_dir = os.environ.get("TONY_WORKER_LEASE_DIR", os.path.join(tempfile.gettempdir(), "tony-worker-ids"))
+            leased = self.lease_worker_id(lease_dir)
+            if leased is not None:
+                worker_id, self._lease = leased  # The lock lives as long as this file stays open
+        if worker_id is None:
+            worker_id = random.getrandbits(self.WORKER_BITS)
+            print(f"WARNING: no TONY_WORKER_ID and no worker id lease available; using random worker id {worker_id}. "
+                  f"Concurrent writers may generate duplicate event ids.", file=sys.stderr)
+        if not 0 <= worker_id < 1 << self.WORKER_BITS:
+            raise ValueError(f"worker_id must be between 0 and {(1 << self.WORKER_BITS) - 1}.")
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    @classmethod
+    def lease_worker_id(cls, lease_dir):
+        """Lock the first free worker-<id>.lock file in lease_dir; return (worker id, open file) or None."""
+        try:
+            import fcntl
+        except ImportError:
+            return None  # No flock (Windows)
+        try:
+            os.makedirs(lease_dir, exist_ok=True)
+        except OSError:
+            return None
+        for worker_id in range(1 << cls.WORKER_BITS):
+            try:
+                lease = open(os.path.join(lease_dir, f"worker-{worker_id}.lock"), "a")
+            except OSError:
+                return None
+            try:
+                fcntl.flock(lease, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lease.close()  # Held by another running process
+                continue
+            return worker_id, lease
+        return None
+
+    def next_id(self):
+        with self._lock:
+            now_ms = int(time.time() * 1000) - self.EPOCH_MS
+            if now_ms <= self._last_ms:
+                # Same millisecond, or the clock went backwards: keep counting from the last one
+                now_ms = self._last_ms
+                self._sequence = (self._sequence + 1) & ((1 << self.SEQUENCE_BITS) - 1)
+                if self._sequence == 0:
+                    now_ms += 1  # Sequence exhausted: borrow the next millisecond
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            return (now_ms << (self.WORKER_BITS + self.SEQUENCE_BITS)) | (self.worker_id << self.SEQUENCE_BITS) | self._sequence
+
+
+_id_generator = None
+
+
+def get_id_generator():
+    """Return the shared ID generator, leasing its worker id on first use."""
+    global _id_generator
+    with _backend_lock:
+        if _id_generator is None:
+            _id_generator = SnowflakeIdGenerator()
+        return _id_generator
+
+
+class BatchedEventWriter:
+    """
+    Queue stress events and insert them in columnar batches from a background thread.
+
+    ClickHouse creates one part per INSERT, so single-row inserts cause merge pressure.
+    Batches go to backend.insert_events(rows) with rows of (id, event, level, timestamp).
+    A batch is flushed when it reaches batch_size rows or is flush_interval seconds old.
+    The queue holds at most max_queue events; submit() blocks when it is full
+    (backpressure). Pending events are flushed on close(), which runs at exit.
+    """
+
+    _FLUSH = object()
+    _STOP = object()
+
+    def __init__(self, backend, batch_size=1000, flush_interval=1.0, max_queue=10000):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="stress-event-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, event_id, event, level, timestamp=None):
+        # The timestamp is taken now, not when the batch is written
+        self._queue.put((event_id, event, level, timestamp or datetime.now().replace(microsecond=0)))
+
+    def flush(self):
+        """Write everything submitted so far and wait until it is done."""
+        if self._thread.is_alive():
+            self._queue.put(self._FLUSH)
+            self._queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if item is not None and item is not self._FLUSH and item is not self._STOP:
+                batch.append(item)
+            if item is self._FLUSH or item is self._STOP or len(batch) >= self.batch_size or (
+                    time.monotonic() >= deadline):
+                self._write(batch)
+                for _ in batch:
+                    self._queue.task_done()
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+            if item is self._FLUSH or item is self._STOP:
+                self._queue.task_done()
+            if item is self._STOP:
+                return
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self.backend.insert_events(batch)
+        except Exception as e:
+            print(f"Error saving {len(batch)} events: {e}")
+
+
+_event_writer = None
+
+
+def get_event_writer():
+    """Return the shared writer, starting its thread on first use."""
+    global _event_writer
+    backend = get_backend()
+    with _backend_lock:
+        if _event_writer is None:
+            _event_writer = BatchedEventWriter(backend)
+        return _event_writer
+
+
+def save_event(event, level):
+    """Queue a stress event for the next batch insert."""
+    # IDs come from the local generator: no SELECT max(id) round-trip and no race between writers
+    new_id = get_id_generator().next_id()
+    get_event_writer().submit(new_id, event, level)
+    print(f"Event queued: '{event}' with stress level {level}/10.\n")
 
 
 def record_stress():
@@ -51,41 +421,73 @@ def record_stress():
             print("Invalid input. Please enter a number between 1 and 10.")
 
     stress_levels.append({"event": event, "level": level})
-    save_to_clickhouse(event, level)
+    save_event(event, level)
+
+
+def fetch_stress_page(since, after=None, limit=HISTORY_PAGE_SIZE):
+    """Fetch up to limit events newer than since, continuing after the (timestamp, id) key of the last page."""
+    return get_backend().fetch_page(since, after, limit)
 
 
 def view_stress_history():
-    """Display all recorded stress events."""
-    # Fetch data from ClickHouse
-    events = client.query("SELECT event, level, timestamp FROM stress_events ORDER BY timestamp").result_rows
+    """Display recorded stress events from a recent time window, one page at a time."""
+    get_event_writer().flush()
+    days = input(f"Show how many days back? [{HISTORY_DEFAULT_DAYS}]: ").strip()
+    try:
+        days = int(days) if days else HISTORY_DEFAULT_DAYS
+    except ValueError:
+        print(f"Invalid number of days, showing the last {HISTORY_DEFAULT_DAYS}.")
+        days = HISTORY_DEFAULT_DAYS
+    since = datetime.now().replace(microsecond=0) - timedelta(days=days)
 
+    events = fetch_stress_page(since)
     if not events:
-        print("No stress events recorded yet.\n")
+        print(f"No stress events recorded in the last {days} days.\n")
         return
 
     print("\n--- Stress History ---")
-    for idx, (event, level, timestamp) in enumerate(events, 1):
-        print(f"{idx}. {event} - Stress Level: {level}/10 (Timestamp: {timestamp})")
+    idx = 0
+    while events:
+        for _, event, level, timestamp in events:
+            idx += 1
+            print(f"{idx}. {event} - Stress Level: {level}/10 (Timestamp: {timestamp})")
+        if len(events) < HISTORY_PAGE_SIZE or input("Press Enter for more, or 'q' to stop: ").strip().lower() == "q":
+            break
+        last_id, _, _, last_timestamp = events[-1]
+        events = fetch_stress_page(since, after=(last_timestamp, last_id))
     print("----------------------\n")
 
 
 def check_need_for_therapy():
     """Analyze stress levels and determine if therapy is needed."""
-    # Calculate average stress level from ClickHouse
-    result = client.query("SELECT AVG(level) FROM stress_events").result_rows[0][0]
-    if result is None:
+    get_event_writer().flush()
+    # Daily aggregates, so this costs the same at a million events as at a hundred
+    avg_stress, total = get_backend().summary()
+    if not total:
         print("No data to analyze. Add some stress events first.\n")
         return
 
-    avg_stress = result
-    print(f"\nAverage Stress Level: {avg_stress:.2f}/10")
+    print(f"\nAverage Stress Level: {avg_stress:.2f}/10 over {total} events")
     if avg_stress >= 7:
         print("Recommendation: Tony should schedule a session with Dr. Melfi.\n")
     else:
         print("Tony is managing his stress well... for now.\n")
 
 
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Tony's Anxiety Tracker.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), help="Storage backend (default: $TONY_BACKEND or clickhouse).")
+    parser.add_argument("--sqlite-path", default="tony.db", help="Database file for the sqlite backend.")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_arguments()
+    if args.backend == "sqlite":
+        set_backend(SQLiteBackend(args.sqlite_path))
+    elif args.backend:
+        set_backend(BACKENDS[args.backend]())
+
     print("=== Tony's Anxiety Tracker ===")
     while True:
         print("\nOptions:\n1. Record a stress event\n2. View stress history\n3. Check if Tony needs therapy")
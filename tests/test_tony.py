@@ -0,0 +1,96 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scripts"))
+
+import tony  # noqa: E402
+
+
+class RecordingBackend:
+    def __init__(self, gate=None):
+        self.batches = []
+        self.gate = gate
+
+    def insert_events(self, rows):
+        if self.gate is not None:
+            self.gate.wait()
+        self.batches.append(list(rows))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+def submit(writer, count, start=0):
+    for event_id in range(start, start + count):
+        writer.submit(event_id, f"event {event_id}", 5)
+
+
+def test_flushes_when_batch_is_full():
+    backend = RecordingBackend()
+    writer = tony.BatchedEventWriter(backend, batch_size=3, flush_interval=60)
+    submit(writer, 7)
+
+    wait_for(lambda: len(backend.batches) == 2)
+    assert [[row[0] for row in batch] for batch in backend.batches] == [[0, 1, 2], [3, 4, 5]]
+    writer.close()
+
+
+def test_flushes_after_interval():
+    backend = RecordingBackend()
+    writer = tony.BatchedEventWriter(backend, batch_size=100, flush_interval=0.1)
+    submit(writer, 2)
+
+    wait_for(lambda: backend.batches)
+    assert [len(batch) for batch in backend.batches] == [2]
+    writer.close()
+
+
+def test_flush_and_close_drain_the_queue():
+    backend = RecordingBackend()
+    writer = tony.BatchedEventWriter(backend, batch_size=100, flush_interval=60)
+    submit(writer, 4)
+    writer.flush()
+    assert sum(len(batch) for batch in backend.batches) == 4
+
+    submit(writer, 3, start=4)
+    writer.close()
+    assert [row[0] for batch in backend.batches for row in batch] == list(range(7))
+    assert not writer._thread.is_alive()
+
+
+def test_submit_blocks_when_queue_is_full():
+    gate = threading.Event()
+    backend = RecordingBackend(gate)
+    writer = tony.BatchedEventWriter(backend, batch_size=1, flush_interval=60, max_queue=2)
+    submit(writer, 1)
+    wait_for(lambda: writer._queue.empty())  # The writer thread holds event 0 and waits on the gate
+    submit(writer, 2, start=1)  # Fills the queue
+
+    blocked = threading.Thread(target=submit, args=(writer, 1, 3))
+    blocked.start()
+    time.sleep(0.2)
+    assert blocked.is_alive()
+
+    gate.set()
+    blocked.join(timeout=5)
+    assert not blocked.is_alive()
+    writer.close()
+    assert [row[0] for batch in backend.batches for row in batch] == [0, 1, 2, 3]
+
+
+def test_rows_carry_submit_time():
+    backend = RecordingBackend()
+    writer = tony.BatchedEventWriter(backend, batch_size=10, flush_interval=60)
+    writer.submit(1, "fight", 9)
+    writer.close()
+
+    (event_id, event, level, timestamp), = backend.batches[0]
+    assert (event_id, event, level) == (1, "fight", 9)
+    assert timestamp is not None